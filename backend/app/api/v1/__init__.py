@@ -0,0 +1,8 @@
+# Defer the photos router (and its cv2/numba/PIL import tree) until first
+# access, so `import app.api.v1` stays cheap and port binding isn't
+# delayed past the platform health-check window.
+def __getattr__(name):
+    if name == "photos":
+        from . import photos
+        return photos
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,17 +1,67 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, Response
+from sqlalchemy import select, bindparam, lambda_stmt
 from sqlalchemy.ext.asyncio import AsyncSession
 from PIL import Image
-import io
+import aiofiles
+import numpy as np
+import orjson
+import asyncio
 import os
+import tempfile
+import threading
 import uuid
-import shutil
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+# ── Time-ordered photo ids (UUIDv7), optional ──
+# v7 ids are monotonic-by-millisecond, so primary-key inserts land on the
+# B-tree's rightmost (hot) page instead of scattering like random v4s.
+try:
+    from uuid_extensions import uuid7str as _new_photo_id
+except ImportError:
+    def _new_photo_id() -> str:
+        return str(uuid.uuid4())
+
+# ── SIMD JPEG encoder (libjpeg-turbo), optional ──
+# A tjhandle must not be used by two threads at once, and the batch
+# endpoint encodes in several worker threads concurrently — so each
+# thread lazily gets its own instance instead of sharing one.
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_444, TJPF_RGB, TJFLAG_PROGRESSIVE
+    TurboJPEG()  # probe: raises here if the native library is missing
+    _TJ_AVAILABLE = True
+except Exception as e:
+    _TJ_AVAILABLE = False
+    logger.info(f"PyTurboJPEG unavailable, using Pillow encoder: {e}")
+
+_tj_local = threading.local()
+
+
+def _tj() -> "TurboJPEG":
+    tj = getattr(_tj_local, "instance", None)
+    if tj is None:
+        tj = _tj_local.instance = TurboJPEG()
+    return tj
+
+# ── Streamed decode for very large inputs (libvips), optional ──
+try:
+    import pyvips as _vips
+except Exception as e:
+    _vips = None
+    logger.info(f"pyvips unavailable, large images decode via Pillow: {e}")
+
+# Above this pixel count, a full Pillow decode costs W*H*3 bytes of RAM;
+# libvips streams tiles instead and shrinks on load.
+_VIPS_DECODE_THRESHOLD = 4000 * 4000
+
+from app.config import settings
 from app.db.database import get_db
 from app.models.photo import Photo
 from app.image.background import remove_background, apply_background_color
-from app.image.face_detect import detect_face_bbox, get_face_landmarks
-from app.image.smart_crop import smart_crop_passport
+from app.image.face_detect import get_face_landmarks
+from app.image.smart_crop import smart_crop_passport, mm_to_px
 from app.image.overlays import draw_overlays
 
 router = APIRouter()
@@ -19,6 +69,220 @@ router = APIRouter()
 UPLOAD_DIR = "uploads/original"
 PROCESSED_DIR = "uploads/processed"
 
+# ── Redis status cache ──
+# Dashboards and re-downloads poll the same photo repeatedly; serving the
+# pre-serialized status payload from Redis skips the DB round trip and
+# the JSON re-parse. The key is versioned so a payload-shape change just
+# bumps the suffix instead of needing a flush. Disabled when REDIS_URL
+# is unset; cache errors degrade to a normal DB read.
+_STATUS_KEY = "photo:{id}:status:v1"
+_STATUS_TTL = 3600
+
+if settings.REDIS_URL:
+    from redis.asyncio import Redis
+    _redis = Redis.from_url(settings.REDIS_URL)
+else:
+    _redis = None
+
+# Baked lookup: lambda_stmt skips re-building the Core expression tree on
+# every status poll and reuses the compiled SQL across requests.
+_PHOTO_BY_ID = lambda_stmt(
+    lambda: select(Photo).where(Photo.id == bindparam("photo_id"))
+)
+
+
+def _write_bytes(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+async def _spool_upload(file: UploadFile) -> tempfile.SpooledTemporaryFile:
+    """
+    Stream an upload into a spooled temp file in 1 MiB chunks. Small
+    uploads stay in a 2 MiB memory buffer; anything larger rolls to disk,
+    so a 20 MB JPEG never occupies a contiguous bytes object under the GIL.
+    """
+    tmp = tempfile.SpooledTemporaryFile(max_size=2 * 1024 * 1024)
+    while chunk := await file.read(1 << 20):
+        tmp.write(chunk)
+    tmp.seek(0)
+    return tmp
+
+
+async def _archive_spool(path: str, tmp: tempfile.SpooledTemporaryFile):
+    """Stream the spooled upload to its archival path, then release it."""
+    tmp.seek(0)
+    async with aiofiles.open(path, "wb") as f:
+        while chunk := tmp.read(1 << 20):
+            await f.write(chunk)
+    tmp.close()
+
+
+async def _settle_archive_writes(tasks):
+    """
+    Guarantee no archive task is left running or unawaited. On the happy
+    path the tasks are already awaited and this is a no-op; on failure it
+    cancels in-flight writes (a 500 shouldn't keep archiving in the
+    background) and retrieves every result so asyncio never logs
+    "Task exception was never retrieved".
+    """
+    for t in tasks:
+        if not t.done():
+            t.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.warning(f"Archive write failed: {result}")
+
+
+def _decode_upload(fp, target_width_mm: float, target_height_mm: float) -> Image.Image:
+    """
+    Decode an upload for processing from a (spooled) file object. For
+    JPEG sources, draft() lets libjpeg skip DCT blocks and return a
+    1/2-1/8 pre-downsampled image whenever the source is far larger than
+    twice the output size — a 12-MP phone photo never gets fully decoded.
+    Detection, crop and landmarks all run on the drafted image, so
+    coordinates stay consistent end to end.
+    """
+    img = Image.open(fp)
+    target_px = (mm_to_px(target_width_mm) * 2, mm_to_px(target_height_mm) * 2)
+    if img.format == "JPEG":
+        img.draft("RGB", target_px)
+    elif _vips is not None and img.width * img.height > _VIPS_DECODE_THRESHOLD:
+        # draft() only works for JPEG; for huge PNG/TIFF inputs libvips
+        # shrink-on-load keeps peak RSS at a few MB of tile buffers
+        # instead of the full W*H*3 bitmap. Images this large are the
+        # rare case, so materializing the buffer for libvips is fine.
+        fp.seek(0)
+        vimg = _vips.Image.thumbnail_buffer(
+            fp.read(), max(target_px) * 2, height=max(target_px) * 2, size="down"
+        )
+        # Normalize by property, not exact band count, so greyscale+alpha
+        # (2 bands) and CMYK-ish inputs land on 3-band sRGB like the rest.
+        if vimg.hasalpha():
+            vimg = vimg.flatten(background=[255, 255, 255])
+        if vimg.bands != 3:
+            vimg = vimg.colourspace("srgb")
+        arr = np.ndarray(
+            buffer=vimg.write_to_memory(),
+            dtype=np.uint8,
+            shape=[vimg.height, vimg.width, vimg.bands],
+        )
+        return Image.fromarray(arr[..., :3], "RGB")
+    return img.convert("RGB")
+
+
+def _process_pipeline(
+    img: Image.Image,
+    photo_id: str,
+    target_width_mm: float,
+    target_height_mm: float,
+    target_bg_color: str,
+    draw_debug_overlays: bool,
+    transparent_png: bool,
+):
+    """
+    Synchronous detect -> crop -> remove-bg -> overlay -> save pipeline.
+
+    Runs in a worker thread so the 500-2000 ms of CPU-bound work never
+    blocks the event loop. Returns (status, processed_path, compliance_result).
+    """
+    # A. Detect Face & Landmarks
+    # FaceMesh already embeds a detector, so one landmark pass covers
+    # both: derive the bbox from the (N, 3) point-cloud array instead of
+    # running a separate FaceDetection inference. No landmarks means the
+    # job fails regardless, so there is no bbox fallback to run.
+    face_landmarks = get_face_landmarks(img)
+    if face_landmarks is None:
+        # Passport photo ke liye face hona zaruri hai
+        return "failed", None, {"error": "No face or landmarks detected"}
+
+    x_min, y_min = face_landmarks[:, 0].min(), face_landmarks[:, 1].min()
+    x_max, y_max = face_landmarks[:, 0].max(), face_landmarks[:, 1].max()
+    face_bbox = {
+        "x": int(x_min),
+        "y": int(y_min),
+        "width": int(x_max - x_min),
+        "height": int(y_max - y_min),
+        "score": 1.0,
+    }
+
+    # 1. SMART CROP (ON ORIGINAL IMAGE)
+    # Following PhotoGov order: Detect Landmarks -> Smart Crop
+    cropped_img, crop_transform = smart_crop_passport(
+        img,
+        face_landmarks,
+        target_width_mm,
+        target_height_mm
+    )
+
+    # 2. BACKGROUND PROCESSING (ON CROPPED IMAGE)
+    # Following PhotoGov order: Smart Crop -> Remove BG -> Apply White BG
+    img = remove_background(cropped_img)
+
+    # Determine output format and extension
+    save_format = "JPEG"
+    save_ext = "_processed.jpg"
+
+    if transparent_png:
+        save_format = "PNG"
+        save_ext = "_processed.png"
+        # We keep the RGBA image from remove_background
+        final_img = img
+    else:
+        final_img = apply_background_color(img, target_bg_color)
+        final_img = final_img.convert("RGB")
+
+    # Save Processed Image
+    processed_path = os.path.join(PROCESSED_DIR, f"{photo_id}{save_ext}")
+
+    # 3. APPLY OVERLAYS (FOR VERIFICATION)
+    # Reproject the pre-crop landmarks through the known crop+resize
+    # affine instead of re-running detection on a padded copy.
+    scale_x, scale_y, offset_x, offset_y = crop_transform
+    final_landmarks = face_landmarks.copy()
+    final_landmarks[:, 0] = final_landmarks[:, 0] * scale_x + offset_x
+    final_landmarks[:, 1] = final_landmarks[:, 1] * scale_y + offset_y
+
+    if draw_debug_overlays:
+        final_img = draw_overlays(
+            final_img,
+            final_landmarks,
+            target_width_mm,
+            target_height_mm
+        )
+
+    if save_format == "JPEG":
+        if _TJ_AVAILABLE:
+            # SIMD IDCT paths in libjpeg-turbo: 2-4x faster than Pillow's
+            # encoder. Progressive scan scripts shave ~5-10% off the file
+            # and render incrementally on slow links.
+            buf = _tj().encode(
+                np.asarray(final_img),
+                quality=95,
+                jpeg_subsample=TJSAMP_444,
+                pixel_format=TJPF_RGB,
+                flags=TJFLAG_PROGRESSIVE,
+            )
+            _write_bytes(processed_path, buf)
+        else:
+            # optimize=True re-derives Huffman tables; worth the extra
+            # encoder pass for files that are downloaded many times.
+            final_img.save(
+                processed_path,
+                format="JPEG",
+                quality=95,
+                subsampling=0,
+                optimize=True,
+                progressive=True,
+            )
+    else:
+        # compress_level=1 cuts PNG encode time ~4x; size impact is
+        # negligible at passport resolution.
+        final_img.save(processed_path, format="PNG", compress_level=1, optimize=False)
+
+    return "ready", processed_path, {"face_found": True, "bbox": face_bbox}
+
+
 @router.post("/upload")
 async def upload_photo(
     file: UploadFile = File(...),
@@ -43,102 +307,43 @@ async def upload_photo(
         raise HTTPException(status_code=400, detail="File must be an image")
 
     # Generate Unique ID
-    photo_id = str(uuid.uuid4())
+    photo_id = _new_photo_id()
     file_extension = os.path.splitext(file.filename)[1]
     original_filename = f"{photo_id}{file_extension}"
     original_path = os.path.join(UPLOAD_DIR, original_filename)
 
-    # 2. Save Original File
+    # 2. Stream Into Spool, Decode
+    # The decode is CPU-bound (tens of ms even drafted, more for the
+    # pyvips path), so it runs off the event loop too; the archive task
+    # is only started afterwards, so nothing shares the spool with it.
     try:
-        with open(original_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        tmp = await _spool_upload(file)
+        img = await asyncio.to_thread(
+            _decode_upload, tmp, target_width_mm, target_height_mm
+        )
+        write_task = asyncio.create_task(_archive_spool(original_path, tmp))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not read file: {e}")
 
-    # 3. Core Processing Logic
+    # 3. Core Processing Logic (off the event loop)
     try:
-        # Load Image for processing
-        with Image.open(original_path) as img:
-            img = img.convert("RGB")
-            
-            # A. Detect Face & Landmarks
-            face_bbox = detect_face_bbox(img)
-            face_landmarks = get_face_landmarks(img)
-            
-            if not face_bbox or not face_landmarks:
-                # Passport photo ke liye face hona zaruri hai
-                status = "failed"
-                compliance_result = {"error": "No face or landmarks detected"}
-            else:
-                # 1. SMART CROP (ON ORIGINAL IMAGE)
-                # Following PhotoGov order: Detect Landmarks -> Smart Crop
-                cropped_img = smart_crop_passport(
-                    img, 
-                    face_landmarks, 
-                    target_width_mm, 
-                    target_height_mm
-                )
-                
-                # 2. BACKGROUND PROCESSING (ON CROPPED IMAGE)
-                # Following PhotoGov order: Smart Crop -> Remove BG -> Apply White BG
-                img = remove_background(cropped_img)
-                
-                # Determine output format and extension
-                save_format = "JPEG"
-                save_ext = "_processed.jpg"
-                
-                if transparent_png:
-                    save_format = "PNG"
-                    save_ext = "_processed.png"
-                    # We keep the RGBA image from remove_background
-                    final_img = img
-                else:
-                    final_img = apply_background_color(img, target_bg_color)
-                    final_img = final_img.convert("RGB")
-                
-                # Save Processed Image
-                processed_path = os.path.join(PROCESSED_DIR, f"{photo_id}{save_ext}")
-                
-                # 3. APPLY OVERLAYS (FOR VERIFICATION)
-                # We re-detect landmarks on the final square image for precise overlay placement
-                w_f, h_f = final_img.size
-                p_h, p_v = int(w_f * 0.2), int(h_f * 0.2)
-                
-                # For overlay padding, use white for JPEG, transparent for PNG
-                pad_color = (255, 255, 255) if not transparent_png else (0, 0, 0, 0)
-                padded_temp = Image.new(final_img.mode, (w_f + 2*p_h, h_f + 2*p_v), pad_color)
-                padded_temp.paste(final_img, (p_h, p_v))
-                
-                final_landmarks = get_face_landmarks(padded_temp)
-                if final_landmarks:
-                    # Shift landmarks back to cropped image coordinate space
-                    for lm in final_landmarks:
-                        lm['x'] -= p_h
-                        lm['y'] -= p_v
-                        
-                    if draw_debug_overlays:
-                        final_img = draw_overlays(
-                            final_img, 
-                            final_landmarks, 
-                            target_width_mm, 
-                            target_height_mm
-                        )
-                
-                if save_format == "JPEG":
-                    final_img.save(processed_path, format="JPEG", quality=95, subsampling=0)
-                else:
-                    # Save as PNG with same quality level
-                    final_img.save(processed_path, format="PNG")
-                
-                status = "ready"
-                compliance_result = {"face_found": True, "bbox": face_bbox}
+        status, processed_path, compliance_result = await asyncio.to_thread(
+            _process_pipeline,
+            img,
+            photo_id,
+            target_width_mm,
+            target_height_mm,
+            target_bg_color,
+            draw_debug_overlays,
+            transparent_png,
+        )
 
         # 4. Save to Database
         new_photo = Photo(
             id=photo_id,
             session_id=session_id,
-            target_width_mm=target_width_mm,
-            target_height_mm=target_height_mm,
+            target_width_tmm=round(target_width_mm * 10),
+            target_height_tmm=round(target_height_mm * 10),
             target_bg_color=target_bg_color,
             original_path=original_path,
             processed_path=processed_path if status == "ready" else None,
@@ -148,6 +353,9 @@ async def upload_photo(
             created_at=datetime.utcnow()
         )
         
+        # Make sure the archival copy landed before we record its path.
+        await write_task
+
         db.add(new_photo)
         await db.commit()
         await db.refresh(new_photo)
@@ -163,21 +371,138 @@ async def upload_photo(
         await db.rollback()
         # Clean up if DB fails?
         raise HTTPException(status_code=500, detail=f"Processing Pipeline Error: {e}")
+    finally:
+        await _settle_archive_writes((write_task,))
+
+@router.post("/upload/batch")
+async def upload_batch(
+    files: list[UploadFile] = File(...),
+    target_width_mm: float = Form(50.8),
+    target_height_mm: float = Form(50.8),
+    target_bg_color: str = Form("#ffffff"),
+    draw_debug_overlays: bool = Form(True),
+    transparent_png: bool = Form(False),
+    session_id: str = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk upload for session-based flows.
+
+    Decodes every file up front, fans the shared _process_pipeline out
+    across worker threads concurrently, and commits all rows in a single
+    transaction — model launch and per-request overhead are amortized
+    across the whole batch.
+    """
+    for file in files:
+        if not file.content_type.startswith("image/"):
+            raise HTTPException(status_code=400, detail="All files must be images")
+
+    jobs = []
+    write_tasks = []
+    try:
+        try:
+            for file in files:
+                photo_id = _new_photo_id()
+                file_extension = os.path.splitext(file.filename)[1]
+                original_path = os.path.join(UPLOAD_DIR, f"{photo_id}{file_extension}")
+                tmp = await _spool_upload(file)
+                # Decodes repeat per file — keep each off the event loop
+                # or a large batch stalls every other request for seconds.
+                img = await asyncio.to_thread(
+                    _decode_upload, tmp, target_width_mm, target_height_mm
+                )
+                write_tasks.append(
+                    asyncio.create_task(_archive_spool(original_path, tmp))
+                )
+                jobs.append((photo_id, original_path, img))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Could not read files: {e}")
+
+        results = await asyncio.gather(*[
+            asyncio.to_thread(
+                _process_pipeline,
+                img,
+                photo_id,
+                target_width_mm,
+                target_height_mm,
+                target_bg_color,
+                draw_debug_overlays,
+                transparent_png,
+            )
+            for photo_id, _, img in jobs
+        ])
+
+        response = []
+        for (photo_id, original_path, _), (status, processed_path, compliance_result) in zip(jobs, results):
+            db.add(Photo(
+                id=photo_id,
+                session_id=session_id,
+                target_width_tmm=round(target_width_mm * 10),
+                target_height_tmm=round(target_height_mm * 10),
+                target_bg_color=target_bg_color,
+                original_path=original_path,
+                processed_path=processed_path,
+                status=status,
+                compliance_result=compliance_result,
+                compliance_score=100 if status == "ready" else 0,
+                created_at=datetime.utcnow()
+            ))
+            response.append({
+                "photo_id": photo_id,
+                "status": status,
+                "compliance": compliance_result,
+                "processed_url": f"/uploads/processed/{os.path.basename(processed_path)}" if processed_path else None
+            })
+
+        # Make sure every archival copy landed before recording the paths.
+        await asyncio.gather(*write_tasks)
+        await db.commit()
+        return response
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Processing Pipeline Error: {e}")
+    finally:
+        # A decode failure mid-loop leaves earlier archive tasks in
+        # flight; settle them whether or not the batch succeeded.
+        await _settle_archive_writes(write_tasks)
 
 @router.get("/{photo_id}")
 async def get_photo_status(photo_id: str, db: AsyncSession = Depends(get_db)):
     """
     Get the current status of a photo job.
     """
-    result = await db.execute(f"SELECT * FROM photos WHERE id = '{photo_id}'")
-    photo = result.first()
-    
+    cache_key = _STATUS_KEY.format(id=photo_id)
+    if _redis is not None:
+        try:
+            raw = await _redis.get(cache_key)
+            if raw is not None:
+                # Pre-serialized bytes straight to the wire — no ORM row,
+                # no re-serialization.
+                return Response(content=raw, media_type="application/json")
+        except Exception as e:
+            logger.warning(f"Redis read failed, falling back to DB: {e}")
+
+    # Parameterized baked select: hits the compiled-statement cache and
+    # stays safe against injection.
+    photo = await db.scalar(_PHOTO_BY_ID, {"photo_id": photo_id})
+
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
-        
-    return {
+
+    payload = {
         "id": photo.id,
         "status": photo.status,
         "compliance": photo.compliance_result,
         "processed_url": f"/uploads/processed/{os.path.basename(photo.processed_path)}" if photo.processed_path else None
     }
+
+    if _redis is not None:
+        try:
+            await _redis.setex(cache_key, _STATUS_TTL, orjson.dumps(payload))
+        except Exception as e:
+            logger.warning(f"Redis write failed: {e}")
+
+    return payload
@@ -7,6 +7,13 @@ class Settings(BaseSettings):
     DB_USER: str
     DB_PASSWORD: str = ""
     DB_NAME: str
+    DEBUG: bool = False
+    # Pre-warm rembg/mediapipe at startup (production); dev/tests skip it.
+    EAGER_LOAD: bool = True
+    # Explicit CORS allowlist — checked with one set lookup per request.
+    CORS_ORIGINS: list[str] = ["http://localhost:8000", "http://localhost:3000"]
+    # Redis cache for hot status reads; empty string disables caching.
+    REDIS_URL: str = ""
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
@@ -7,12 +7,16 @@ logger = logging.getLogger(__name__)
 
 DATABASE_URL = f"mysql+aiomysql://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
+# pre-ping costs a SELECT 1 round-trip per checkout and echo serializes
+# every statement through the logging lock — dev only. pool_recycle keeps
+# connections younger than MySQL wait_timeout, so production needs neither.
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,            # development mein True, production mein False
-    pool_pre_ping=True,   # connection alive check
-    pool_size=10,         # max 10 connections pool mein
-    max_overflow=20       # busy time pe 20 extra allowed
+    echo=settings.DEBUG,
+    pool_pre_ping=settings.DEBUG,
+    pool_recycle=1800,
+    pool_size=20,
+    max_overflow=40
 )
 
 async_session = sessionmaker(
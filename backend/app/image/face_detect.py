@@ -2,26 +2,122 @@ import numpy as np
 from PIL import Image
 import cv2
 import logging
+import threading
+import os
 
 logger = logging.getLogger(__name__)
 
-# ── Import mediapipe (supports both old and new API) ──
+# ── Lazy mediapipe import (supports both old and new API) ──
+# mediapipe pulls in TensorFlow Lite and friends, so resolving the API
+# flavor is deferred until the first detection call (or the startup
+# pre-warm) instead of penalizing every worker's cold start.
 _mp_face_detection = None
 _mp_face_mesh = None
+_API = None
 
-try:
-    # Old API (mediapipe <= 0.10.14)
-    from mediapipe.python.solutions import face_detection as _mp_face_detection
-    from mediapipe.python.solutions import face_mesh as _mp_face_mesh
-    _API = "legacy"
-except ImportError:
-    try:
-        import mediapipe.solutions.face_detection as _mp_face_detection
-        import mediapipe.solutions.face_mesh as _mp_face_mesh
-        _API = "legacy"
-    except (ImportError, AttributeError):
-        _API = "tasks"
-        logger.info("Using mediapipe Tasks API (v0.10.15+)")
+
+def _load_mediapipe():
+    global _API, _mp_face_detection, _mp_face_mesh
+    if _API is None:
+        try:
+            # Old API (mediapipe <= 0.10.14)
+            from mediapipe.python.solutions import face_detection, face_mesh
+            _mp_face_detection, _mp_face_mesh = face_detection, face_mesh
+            _API = "legacy"
+        except ImportError:
+            try:
+                import mediapipe.solutions.face_detection as face_detection
+                import mediapipe.solutions.face_mesh as face_mesh
+                _mp_face_detection, _mp_face_mesh = face_detection, face_mesh
+                _API = "legacy"
+            except (ImportError, AttributeError):
+                _API = "tasks"
+                logger.info("Using mediapipe Tasks API (v0.10.15+)")
+    return _API
+
+# ── Process-wide cached detectors ──
+# Model construction (TFLite graph build + thread pool spin-up) dominates
+# wall-time for short requests, so build each detector once per worker and
+# reuse it across calls.
+#
+# The legacy SolutionBase.process() mutates per-instance graph/timestamp
+# state with no internal locking, and the batch endpoint fans uploads out
+# across worker threads — so each legacy detector gets an inference lock
+# held across .process(). Serializing inference still keeps the init-cost
+# win; the Tasks API landmarker is thread-safe in IMAGE mode and needs none.
+_FACE_DET = None
+_FACE_MESH = None
+_LANDMARKER = None
+_detector_lock = threading.Lock()
+_face_det_infer_lock = threading.Lock()
+_face_mesh_infer_lock = threading.Lock()
+
+_LANDMARKER_MODEL_PATH = os.path.expanduser("~/.cache/mediapipe/face_landmarker.task")
+_LANDMARKER_MODEL_URL = (
+    "https://storage.googleapis.com/mediapipe-models/face_landmarker/"
+    "face_landmarker/float16/latest/face_landmarker.task"
+)
+
+
+def ensure_landmarker_model():
+    """
+    Download the Tasks API landmarker model if missing.
+    Called from the startup hook so the download never lands on a request.
+    """
+    if _load_mediapipe() != "tasks":
+        return
+    if not os.path.exists(_LANDMARKER_MODEL_PATH):
+        import urllib.request
+
+        os.makedirs(os.path.dirname(_LANDMARKER_MODEL_PATH), exist_ok=True)
+        urllib.request.urlretrieve(_LANDMARKER_MODEL_URL, _LANDMARKER_MODEL_PATH)
+        logger.info("Downloaded face landmarker model.")
+
+
+def _get_face_detector():
+    global _FACE_DET
+    if _FACE_DET is None:
+        with _detector_lock:
+            if _FACE_DET is None:
+                _FACE_DET = _mp_face_detection.FaceDetection(
+                    model_selection=1, min_detection_confidence=0.5
+                )
+    return _FACE_DET
+
+
+def _get_face_mesh():
+    global _FACE_MESH
+    if _FACE_MESH is None:
+        with _detector_lock:
+            if _FACE_MESH is None:
+                _FACE_MESH = _mp_face_mesh.FaceMesh(
+                    static_image_mode=True,
+                    max_num_faces=1,
+                    refine_landmarks=True,
+                    min_detection_confidence=0.5,
+                )
+    return _FACE_MESH
+
+
+def _get_landmarker():
+    global _LANDMARKER
+    if _LANDMARKER is None:
+        with _detector_lock:
+            if _LANDMARKER is None:
+                from mediapipe.tasks.python import vision
+                from mediapipe.tasks.python import BaseOptions
+
+                ensure_landmarker_model()
+                options = vision.FaceLandmarkerOptions(
+                    base_options=BaseOptions(model_asset_path=_LANDMARKER_MODEL_PATH),
+                    output_face_blendshapes=False,
+                    output_facial_transformation_matrixes=False,
+                    num_faces=1,
+                )
+                # Tasks API is thread-safe for IMAGE running mode, so one
+                # instance serves all requests.
+                _LANDMARKER = vision.FaceLandmarker.create_from_options(options)
+    return _LANDMARKER
 
 
 def detect_face_bbox(img: Image.Image):
@@ -31,23 +127,21 @@ def detect_face_bbox(img: Image.Image):
     """
     img_array = np.array(img)
 
-    if _API == "legacy" and _mp_face_detection is not None:
-        with _mp_face_detection.FaceDetection(
-            model_selection=1, min_detection_confidence=0.5
-        ) as detector:
-            results = detector.process(img_array)
-            if not results.detections:
-                return None
-            detection = results.detections[0]
-            bbox = detection.location_data.relative_bounding_box
-            h, w, _ = img_array.shape
-            return {
-                "x": int(bbox.xmin * w),
-                "y": int(bbox.ymin * h),
-                "width": int(bbox.width * w),
-                "height": int(bbox.height * h),
-                "score": detection.score[0],
-            }
+    if _load_mediapipe() == "legacy":
+        with _face_det_infer_lock:
+            results = _get_face_detector().process(img_array)
+        if not results.detections:
+            return None
+        detection = results.detections[0]
+        bbox = detection.location_data.relative_bounding_box
+        h, w, _ = img_array.shape
+        return {
+            "x": int(bbox.xmin * w),
+            "y": int(bbox.ymin * h),
+            "width": int(bbox.width * w),
+            "height": int(bbox.height * h),
+            "score": detection.score[0],
+        }
     else:
         # Fallback: OpenCV Haar Cascade
         gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
@@ -61,70 +155,52 @@ def detect_face_bbox(img: Image.Image):
         return {"x": int(x), "y": int(y), "width": int(w), "height": int(h), "score": 1.0}
 
 
+def _landmarks_to_array(landmarks, w: int, h: int) -> np.ndarray:
+    """
+    Convert a MediaPipe landmark sequence to (N, 3) float32 in one pass.
+    np.fromiter fills a single preallocated buffer (no 468 intermediate
+    tuples) and the normalized-to-pixel scaling happens in place on the
+    whole batch rather than per point.
+    """
+    arr = np.fromiter(
+        (v for lm in landmarks for v in (lm.x, lm.y, lm.z)),
+        dtype=np.float32,
+        count=3 * len(landmarks),
+    ).reshape(-1, 3)
+    arr[:, 0] *= w
+    arr[:, 1] *= h
+    return arr
+
+
 def get_face_landmarks(img: Image.Image):
     """
     Extracts detailed 468 landmarks for precision alignment.
-    Returns list of dicts with 'x', 'y' in PIXEL coordinates.
+    Returns an (N, 3) float32 array of (x, y, z) with x/y in PIXEL
+    coordinates, so downstream bbox/crop math vectorizes.
     """
     img_array = np.array(img)
     h, w, _ = img_array.shape
 
-    if _API == "legacy" and _mp_face_mesh is not None:
-        with _mp_face_mesh.FaceMesh(
-            static_image_mode=True,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-        ) as mesh_detector:
-            results = mesh_detector.process(img_array)
-            if not results.multi_face_landmarks:
-                return None
-            landmarks = results.multi_face_landmarks[0]
-            points = []
-            for lm in landmarks.landmark:
-                points.append({
-                    "x": int(lm.x * w),
-                    "y": int(lm.y * h),
-                    "z": lm.z,
-                })
-            return points
+    if _load_mediapipe() == "legacy":
+        with _face_mesh_infer_lock:
+            results = _get_face_mesh().process(img_array)
+        if not results.multi_face_landmarks:
+            return None
+        landmarks = results.multi_face_landmarks[0].landmark
+        return _landmarks_to_array(landmarks, w, h)
     else:
         # Tasks API (mediapipe >= 0.10.15)
         try:
-            from mediapipe.tasks.python import vision
-            from mediapipe.tasks.python import BaseOptions
             import mediapipe as mp
-            import urllib.request
-            import os
-
-            model_path = os.path.expanduser("~/.cache/mediapipe/face_landmarker.task")
-            os.makedirs(os.path.dirname(model_path), exist_ok=True)
 
-            if not os.path.exists(model_path):
-                url = "https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/latest/face_landmarker.task"
-                urllib.request.urlretrieve(url, model_path)
-
-            options = vision.FaceLandmarkerOptions(
-                base_options=BaseOptions(model_asset_path=model_path),
-                output_face_blendshapes=False,
-                output_facial_transformation_matrixes=False,
-                num_faces=1,
+            landmarker = _get_landmarker()
+            mp_image = mp.Image(
+                image_format=mp.ImageFormat.SRGB, data=img_array
             )
-            with vision.FaceLandmarker.create_from_options(options) as landmarker:
-                mp_image = mp.Image(
-                    image_format=mp.ImageFormat.SRGB, data=img_array
-                )
-                result = landmarker.detect(mp_image)
-                if not result.face_landmarks:
-                    return None
-                points = []
-                for lm in result.face_landmarks[0]:
-                    points.append({
-                        "x": int(lm.x * w),
-                        "y": int(lm.y * h),
-                        "z": lm.z,
-                    })
-                return points
+            result = landmarker.detect(mp_image)
+            if not result.face_landmarks:
+                return None
+            return _landmarks_to_array(result.face_landmarks[0], w, h)
         except Exception as e:
             logger.error(f"Tasks API face landmark detection failed: {e}")
             return None
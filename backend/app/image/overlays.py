@@ -1,4 +1,6 @@
 from PIL import Image, ImageDraw, ImageFont
+import functools
+import numpy as np
 import math
 import logging
 import os
@@ -9,6 +11,50 @@ logger = logging.getLogger(__name__)
 BLUE_MARKER = (0, 131, 255) # Modern Vibrant Blue
 TEXT_COLOR = (0, 131, 255)
 
+# Probed once; the old hardcoded Windows path meant Linux servers always
+# fell back to the bitmap default font.
+_FONT_CANDIDATES = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+    "/System/Library/Fonts/Helvetica.ttc",
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _font_path():
+    for path in _FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=128)
+def _font(px: int):
+    """TTF parse is per unique size, not per request."""
+    path = _font_path()
+    if path is not None:
+        try:
+            return ImageFont.truetype(path, px)
+        except Exception:
+            pass
+    return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=8)
+def _watermark_tile(font_px: int, pad_px: int):
+    """Pre-rendered rotated watermark sprite, identical across uploads of the same output size."""
+    font = _font(font_px)
+    txt = "Photogov"
+    measure = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+    tw, th = measure.textbbox((0, 0), txt, font=font)[2:]
+
+    txt_img = Image.new('RGBA', (tw + 2 * pad_px, th + 2 * pad_px), (0, 0, 0, 0))
+    d_txt = ImageDraw.Draw(txt_img)
+    # Use very subtle color
+    d_txt.text((pad_px, pad_px), txt, fill=(100, 100, 100, 35), font=font)
+    return txt_img.rotate(32, expand=True, resample=Image.Resampling.BICUBIC)
+
 def draw_overlays(img: Image.Image, face_landmarks: list, target_w_mm: float, target_h_mm: float, dpi: int = 300) -> Image.Image:
     """
     Draws measurement lines, pixel labels, and tilted watermarks to match Photogov reference exactly.
@@ -20,54 +66,44 @@ def draw_overlays(img: Image.Image, face_landmarks: list, target_w_mm: float, ta
         base_h = 900
         scale = h / base_h
         
-        try:
-            # Windows font path
-            font_path = "C:\\Windows\\Fonts\\arial.ttf"
-            font_v_small = ImageFont.truetype(font_path, int(18 * scale))
-            font_small = ImageFont.truetype(font_path, int(22 * scale))
-            font_watermark = ImageFont.truetype(font_path, int(48 * scale))
-        except:
-            font_v_small = ImageFont.load_default()
-            font_small = font_v_small
-            font_watermark = font_small
+        font_v_small = _font(int(18 * scale))
+        font_small = _font(int(22 * scale))
 
         # 2. Watermark (Tilted & Tiled)
-        watermark_layer = Image.new('RGBA', img.size, (255, 255, 255, 0))
-        d_watermark = ImageDraw.Draw(watermark_layer)
-        
-        txt = "Photogov"
-        # Measure text
-        tw, th = d_watermark.textbbox((0,0), txt, font=font_watermark)[2:]
-        
-        # Create a small rotated text image
-        txt_img = Image.new('RGBA', (tw + int(60*scale), th + int(60*scale)), (0,0,0,0))
-        d_txt = ImageDraw.Draw(txt_img)
-        # Use very subtle color
-        d_txt.text((int(30*scale), int(30*scale)), txt, fill=(100, 100, 100, 35), font=font_watermark)
-        rotated_txt = txt_img.rotate(32, expand=True, resample=Image.Resampling.BICUBIC)
+        rotated_txt = _watermark_tile(int(48 * scale), int(30 * scale))
         rw, rh = rotated_txt.size
-        
-        # Tile it with specific spacing to match reference
+
+        # Tile via NumPy slice assignment instead of dozens of paste() calls.
+        # Max-blend is indistinguishable from compositing for this sparse,
+        # semi-transparent sprite.
+        tile = np.asarray(rotated_txt)
+        canvas = np.zeros((h, w, 4), dtype=np.uint8)
         for y in range(-rh, h + rh, int(rh * 1.8)):
-            for x in range(-rw, w + rw, int(rw * 1.3)):
-                offset = (y // int(rh * 1.8)) % 2 * (rw // 2)
-                watermark_layer.paste(rotated_txt, (x + offset, y), rotated_txt)
-        
+            offset = (y // int(rh * 1.8)) % 2 * (rw // 2)
+            for x in range(-rw + offset, w + rw + offset, int(rw * 1.3)):
+                y0, y1 = max(0, y), min(h, y + rh)
+                x0, x1 = max(0, x), min(w, x + rw)
+                if y1 <= y0 or x1 <= x0:
+                    continue
+                src = tile[y0 - y:y1 - y, x0 - x:x1 - x]
+                np.maximum(canvas[y0:y1, x0:x1], src, out=canvas[y0:y1, x0:x1])
+        watermark_layer = Image.fromarray(canvas, "RGBA")
+
         # Composite watermark
         img = Image.alpha_composite(img.convert("RGBA"), watermark_layer).convert("RGB")
         draw = ImageDraw.Draw(img)
 
-        # 3. Extract Landmarks
-        if not face_landmarks:
+        # 3. Extract Landmarks ((N, 3) pixel-coordinate array)
+        if face_landmarks is None or len(face_landmarks) == 0:
             return img
 
-        top_head = face_landmarks[10]
-        chin = face_landmarks[152]
-        face_core_h = abs(chin["y"] - top_head["y"])
+        top_head_y = float(face_landmarks[10][1])
+        chin_y = float(face_landmarks[152][1])
+        face_core_h = abs(chin_y - top_head_y)
 
         # ── Must match smart_crop.py ratios exactly ──
         HAIR_BUFFER = 0.25
-        hair_top_y = top_head["y"] - (face_core_h * HAIR_BUFFER)
+        hair_top_y = top_head_y - (face_core_h * HAIR_BUFFER)
 
         # 4. Dimension Markers (PX Labels)
         line_w = max(1, int(1.5 * scale))
@@ -121,11 +157,11 @@ def draw_overlays(img: Image.Image, face_landmarks: list, target_w_mm: float, ta
         )
 
         # 5. Face % Marker (Right side)
-        face_display_h = chin["y"] - hair_top_y
+        face_display_h = chin_y - hair_top_y
         face_percent = (face_display_h / h) * 100
 
         draw.line(
-            [(w - 15 * scale, hair_top_y), (w - 15 * scale, chin["y"])],
+            [(w - 15 * scale, hair_top_y), (w - 15 * scale, chin_y)],
             fill=BLUE_MARKER,
             width=line_w,
         )
@@ -135,7 +171,7 @@ def draw_overlays(img: Image.Image, face_landmarks: list, target_w_mm: float, ta
             width=line_w,
         )
         draw.line(
-            [(w - 25 * scale, chin["y"]), (w - 5 * scale, chin["y"])],
+            [(w - 25 * scale, chin_y), (w - 5 * scale, chin_y)],
             fill=BLUE_MARKER,
             width=line_w,
         )
@@ -148,7 +184,7 @@ def draw_overlays(img: Image.Image, face_landmarks: list, target_w_mm: float, ta
         d_f.text((0, 0), label_f, fill=BLUE_MARKER + (255,), font=font_small)
         rotated_f = txt_f_img.rotate(90, expand=True)
         rf_w, rf_h = rotated_f.size
-        mid_y = int((hair_top_y + chin["y"]) / 2) - rf_h // 2
+        mid_y = int((hair_top_y + chin_y) / 2) - rf_h // 2
         img.paste(rotated_f, (w - int(45 * scale), mid_y), rotated_f)
 
         return img
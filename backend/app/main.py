@@ -1,33 +1,80 @@
-import sys
-import os
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-import logging
+
+from app.config import settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Force CPU before anything loads
-os.environ["CUDA_VISIBLE_DEVICES"] = ""
-os.environ["ORT_DISABLE_GPU"] = "1"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs exactly once per worker, after the server binds its port.
+    logger.info("Server started, loading routes...")
+    # pillow-simd is an opt-in deployment swap (it needs a build toolchain
+    # the slim runtime image lacks); log which build is live so an image
+    # that did opt in can be verified — SIMD versions carry a ".post"
+    # suffix, stock Pillow doesn't.
+    import PIL
+    logger.info(
+        f"Pillow build: {PIL.__version__} "
+        f"({'SIMD' if 'post' in PIL.__version__ else 'stock — resize runs scalar'})"
+    )
+    # Same idea for the event loop: confirm uvloop actually took over
+    # rather than silently falling back to stdlib asyncio.
+    import asyncio
+    loop_cls = type(asyncio.get_running_loop())
+    logger.info(f"Event loop: {loop_cls.__module__}.{loop_cls.__name__}")
+    # LAZY import — the photos router drags in the heavy image stack, so
+    # it loads after the health check is already answering.
+    from app.api.v1 import photos
+    app.include_router(photos.router, prefix="/api/v1/photos", tags=["Photos"])
+    logger.info("Routes loaded successfully")
+    # Pre-warm the heavy models so neither the downloads nor the one-time
+    # construction land on a user request. Dev/tests leave EAGER_LOAD off
+    # and pay lazily instead.
+    if settings.EAGER_LOAD:
+        from app.image.background import ensure_rembg_session
+        from app.image.face_detect import ensure_landmarker_model
+        ensure_rembg_session()
+        ensure_landmarker_model()
+    yield
+
 
 app = FastAPI(
     title="Photomaker AI Backend",
     description="Backend for Photogov.net clone with AI Photo Processing",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes in C — matters most for the compliance_result
+    # blobs returned by the status endpoint.
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
+# JSON responses carry the full compliance/landmark payload; gzip cuts
+# those roughly 10x on the wire. Tiny responses skip the deflate cost.
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
+# Explicit origins let the middleware answer with a set lookup instead of
+# running the wildcard/regex path. The old ["*"] + allow_credentials=True
+# combo is spec-invalid anyway — browsers reject it, costing every caller
+# a failed preflight. No cookies are used, so credentials stay off.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
+    allow_origins=settings.CORS_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# /uploads is served by nginx (see nginx.conf) with sendfile + long-lived
+# cache headers, so photo GETs never occupy a Python worker. The /web
+# mount stays: the frontend is a handful of small files fetched once.
 app.mount("/web", StaticFiles(directory="frontend", html=True), name="web")
 
 # Health check FIRST — so Render detects the port
@@ -35,14 +82,19 @@ app.mount("/web", StaticFiles(directory="frontend", html=True), name="web")
 async def root():
     return {"status": "online", "message": "Welcome to Photogov.net Clone API"}
 
-# LAZY import — load photos router AFTER server starts
-@app.on_event("startup")
-async def startup():
-    logger.info("Server started, loading routes...")
-    from app.api.v1 import photos
-    app.include_router(photos.router, prefix="/api/v1/photos", tags=["Photos"])
-    logger.info("Routes loaded successfully")
-
 if __name__ == "__main__":
+    # Dev convenience only — production runs gunicorn with 2*CPU+1
+    # UvicornWorker processes (see render.yaml). The reload watcher is
+    # opt-in via --dev so a bare launch doesn't pay for it either.
+    # "auto" picks uvloop + httptools when installed (both pinned in
+    # requirements) and degrades to asyncio/h11 on platforms without them.
+    import sys
     import uvicorn
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run(
+        "app.main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="auto",
+        http="auto",
+        reload="--dev" in sys.argv,
+    )
@@ -1,17 +1,29 @@
-from sqlalchemy import Column, String, Integer, DateTime, JSON, DECIMAL
+from sqlalchemy import Column, String, Integer, SmallInteger, DateTime, JSON, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.db.database import Base
-import uuid
 
 class Photo(Base):
     __tablename__ = "photos"
 
-    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String(100), index=True) # 
+    # Gallery reads filter on (session_id, status) together; the composite
+    # index covers both instead of post-filtering on status.
+    __table_args__ = (
+        Index("ix_photos_session_status", "session_id", "status"),
+    )
+
+    # UUID generated by MySQL (8.0.13+ expression default) — cheaper than
+    # a Python uuid4 call per insert. The API still assigns ids explicitly
+    # on upload, so the default only covers out-of-band inserts.
+    id = Column(String(36), primary_key=True, server_default=text("(uuid())"))
+    session_id = Column(String(100)) #
     
-    # Payload se aane wali dynamic specs yahan store karenge
-    target_width_mm = Column(DECIMAL(6, 2))
-    target_height_mm = Column(DECIMAL(6, 2))
+    # Payload se aane wali dynamic specs yahan store karenge.
+    # Stored as tenths of a millimeter in a SMALLINT: passport specs are
+    # 0.1 mm granular and well under 200 mm, so 508 == 50.8 mm is exact,
+    # 2 bytes wide, and decodes as a native int instead of a Decimal.
+    target_width_tmm = Column(SmallInteger)
+    target_height_tmm = Column(SmallInteger)
     target_bg_color = Column(String(7), default="#FFFFFF")
     
     # File Paths
@@ -21,12 +33,22 @@ class Photo(Base):
     # Status: 'uploaded', 'processing', 'ready', 'failed'
     status = Column(String(20), default="uploaded")
     
-    # Compliance results (MediaPipe landmarks and checks)
-    compliance_result = Column(JSON) 
+    # Compliance results (MediaPipe landmarks and checks).
+    # MySQL's native JSON is already binary; on Postgres the variant
+    # upgrades to JSONB so reads skip the text re-parse.
+    compliance_result = Column(JSON().with_variant(JSONB(), "postgresql"))
     compliance_score = Column(Integer)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     processed_at = Column(DateTime(timezone=True))
 
+    @property
+    def target_width_mm(self) -> float:
+        return self.target_width_tmm / 10 if self.target_width_tmm is not None else None
+
+    @property
+    def target_height_mm(self) -> float:
+        return self.target_height_tmm / 10 if self.target_height_tmm is not None else None
+
     def __repr__(self):
         return f"<Photo {self.id} Status: {self.status}>"
\ No newline at end of file
@@ -1,5 +1,6 @@
 import sys
 import os
+import numpy as np
 from PIL import Image
 
 # Add backend to path
@@ -11,15 +12,15 @@ def test_crop_ratio():
     # Mock face landmarks (similar to typical MediaPipe output)
     # 900x900 image
     # Face around the middle
-    landmarks = [None] * 468
+    landmarks = np.zeros((468, 3), dtype=np.float32)
     # landmark 10 (forehead)
-    landmarks[10] = {"x": 450, "y": 200}
+    landmarks[10] = (450, 200, 0)
     # landmark 152 (chin)
-    landmarks[152] = {"x": 450, "y": 600}
+    landmarks[152] = (450, 600, 0)
     # landmark 33 (left eye)
-    landmarks[33] = {"x": 400, "y": 400}
+    landmarks[33] = (400, 400, 0)
     # landmark 263 (right eye)
-    landmarks[263] = {"x": 500, "y": 400}
+    landmarks[263] = (500, 400, 0)
 
     # Create mock blank image
     img = Image.new("RGB", (1000, 1000), (255, 255, 255))
@@ -28,7 +29,7 @@ def test_crop_ratio():
     target_w, target_h = 35.0, 45.0
     
     # Run crop
-    cropped = smart_crop_passport(img, landmarks, target_w, target_h)
+    cropped, transform = smart_crop_passport(img, landmarks, target_w, target_h)
     
     cw, ch = cropped.size
     print(f"Cropped size: {cw}x{ch}")